@@ -1,26 +1,438 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, g, has_request_context
 import re
+import sys
 import logging
 from datetime import datetime
 import os
 import PyPDF2
 import requests
 import json
+import sqlite3
+import threading
+import time
+import atexit
+import hashlib
+import zlib
+import io
+import hmac
+import heapq
+import itertools
+import multiprocessing
+from contextlib import contextmanager
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from bisect import insort, bisect_left
+from collections import deque, Counter
 from werkzeug.utils import secure_filename
 from langdetect import detect, LangDetectException
 
+try:
+    import fcntl
+except ImportError:  # Windows: sem coordenação entre processos
+    fcntl = None
+
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+app.config['HISTORY_DB_PATH'] = os.environ.get('HISTORY_DB_PATH', 'history.db')
+app.config['HISTORY_BATCH_SIZE'] = int(os.environ.get('HISTORY_BATCH_SIZE', 50))
+app.config['HISTORY_FLUSH_INTERVAL'] = float(os.environ.get('HISTORY_FLUSH_INTERVAL', 5))
+app.config['STATS_WINDOW_SIZE'] = int(os.environ.get('STATS_WINDOW_SIZE', 1000))
+app.config['MAX_ATTACHMENTS'] = int(os.environ.get('MAX_ATTACHMENTS', 10))
+app.config['ATTACHMENT_MAX_SIZE'] = int(os.environ.get('ATTACHMENT_MAX_SIZE', 5 * 1024 * 1024))
+app.config['ATTACHMENT_TIMEOUT'] = float(os.environ.get('ATTACHMENT_TIMEOUT', 10))
+app.config['ATTACHMENT_WORKERS'] = int(os.environ.get('ATTACHMENT_WORKERS', 4))
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
+app.config['PROFILE_SAMPLE_INTERVAL'] = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+app.config['SLOW_REQUEST_THRESHOLD'] = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 2))
+app.config['SLOW_REQUEST_BUFFER_SIZE'] = int(os.environ.get('SLOW_REQUEST_BUFFER_SIZE', 20))
+app.config['SLOW_REQUEST_WINDOW'] = float(os.environ.get('SLOW_REQUEST_WINDOW', 3600))
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@contextmanager
+def profile_stage(name):
+    """Acumula o tempo de uma etapa nas métricas da requisição atual"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            stages = g.setdefault('stage_timings', {})
+            stages[name] = round(stages.get(name, 0) + time.perf_counter() - start, 4)
+
+def count_stage_event(name):
+    """Incrementa um contador de eventos da requisição atual"""
+    if has_request_context():
+        events = g.setdefault('stage_events', {})
+        events[name] = events.get(name, 0) + 1
+
+
+class RequestProfiler:
+    """Profiler por amostragem de pilhas para requisições lentas ou sob demanda"""
+
+    def __init__(self, interval=0.005, slow_threshold=2.0, buffer_size=20, window=3600.0, max_depth=64):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.max_depth = max_depth
+        self.buffer_size = buffer_size
+        self.window = window
+        self._lock = threading.Lock()
+        self._active = {}
+        # Min-heap (latência, seq, instante, captura): a mais rápida é descartada ao exceder o limite
+        self._slowest = []
+        self._seq = itertools.count()
+        self._on_demand = deque(maxlen=buffer_size)
+        self._sampler = None
+        self._has_active = threading.Event()
+
+    def _ensure_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+            self._sampler.start()
+
+    def _collapse(self, frame):
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            location = os.path.basename(code.co_filename)
+            if frame.f_lineno is not None:
+                location = f"{location}:{frame.f_lineno}"
+            stack.append(f"{code.co_name} ({location})")
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def _sample_loop(self):
+        while True:
+            # Sem requisições amostradas, a thread fica parada no Event
+            self._has_active.wait()
+            time.sleep(self.interval)
+
+            with self._lock:
+                if not self._active:
+                    self._has_active.clear()
+                    continue
+                targets = list(self._active.items())
+                frames = sys._current_frames()
+
+            # Montar as pilhas fora do lock para não bloquear begin/end/capture
+            samples = [
+                (thread_id, stacks, self._collapse(frames[thread_id]))
+                for thread_id, stacks in targets if thread_id in frames
+            ]
+            del frames
+
+            with self._lock:
+                for thread_id, stacks, stack in samples:
+                    if self._active.get(thread_id) is stacks:
+                        stacks[stack] += 1
+
+    def begin(self, thread_id):
+        """Inicia a amostragem da thread da requisição"""
+        with self._lock:
+            self._active[thread_id] = Counter()
+            self._has_active.set()
+            self._ensure_sampler()
+
+    def is_active(self, thread_id):
+        """Indica se a thread está sendo amostrada"""
+        with self._lock:
+            return thread_id in self._active
+
+    def merge(self, thread_id, stacks, root):
+        """Agrega pilhas coletadas em outra thread/processo ao perfil da requisição"""
+        with self._lock:
+            target = self._active.get(thread_id)
+            if target is None:
+                return
+            for stack, count in stacks.items():
+                target[f"{root};{stack}"] += count
+
+    def end(self, thread_id):
+        """Encerra a amostragem e retorna as pilhas coletadas"""
+        with self._lock:
+            stacks = self._active.pop(thread_id, Counter())
+            if not self._active:
+                self._has_active.clear()
+            return stacks
+
+    def build_profile(self, stacks, latency, top=25):
+        """Formata as pilhas no formato 'collapsed' (compatível com flamegraph)"""
+        return {
+            "latency": round(latency, 4),
+            "sample_interval": self.interval,
+            "samples": sum(stacks.values()),
+            "stage_timings": g.get('stage_timings', {}),
+            "stage_events": g.get('stage_events', {}),
+            "stacks": [
+                {"stack": stack, "count": count} for stack, count in stacks.most_common(top)
+            ]
+        }
+
+    def capture(self, profile, on_demand, is_slow):
+        """Guarda o perfil entre as N mais lentas e/ou entre as capturas sob demanda"""
+        entry = dict(profile)
+        entry.update({
+            "timestamp": datetime.now().isoformat(),
+            "path": request.path,
+            "on_demand": on_demand
+        })
+        with self._lock:
+            if is_slow:
+                self._expire_slowest()
+                item = (entry['latency'], next(self._seq), time.monotonic(), entry)
+                if len(self._slowest) < self.buffer_size:
+                    heapq.heappush(self._slowest, item)
+                else:
+                    heapq.heappushpop(self._slowest, item)
+            if on_demand:
+                self._on_demand.append(entry)
+
+    def _expire_slowest(self):
+        """Remove capturas fora da janela de recência (chamar com o lock)"""
+        cutoff = time.monotonic() - self.window
+        if any(captured_at < cutoff for _, _, captured_at, _ in self._slowest):
+            self._slowest = [item for item in self._slowest if item[2] >= cutoff]
+            heapq.heapify(self._slowest)
+
+    def get_slowest(self):
+        """Retorna as N requisições recentes mais lentas, da maior para a menor latência"""
+        with self._lock:
+            self._expire_slowest()
+            items = list(self._slowest)
+        return [entry for _, _, _, entry in sorted(items, reverse=True)]
+
+    def get_on_demand(self):
+        """Retorna as capturas sob demanda, da mais recente para a mais antiga"""
+        with self._lock:
+            return list(reversed(self._on_demand))
+
+profiler = RequestProfiler(
+    interval=app.config['PROFILE_SAMPLE_INTERVAL'],
+    slow_threshold=app.config['SLOW_REQUEST_THRESHOLD'],
+    buffer_size=app.config['SLOW_REQUEST_BUFFER_SIZE'],
+    window=app.config['SLOW_REQUEST_WINDOW']
+)
+
+def is_admin_request():
+    """Valida o token administrativo enviado no header X-Admin-Token"""
+    admin_token = app.config['ADMIN_TOKEN']
+    provided = request.headers.get('X-Admin-Token', '')
+    # Comparar bytes: compare_digest rejeita str não-ASCII (headers chegam como latin-1)
+    return bool(admin_token) and hmac.compare_digest(
+        provided.encode('utf-8'), admin_token.encode('utf-8')
+    )
+
+def profiled(view):
+    """Amostra a requisição e captura o perfil se lenta ou solicitada pelo admin"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        profile_requested = request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'
+        on_demand = profile_requested and is_admin_request()
+        auto_capture = profiler.slow_threshold > 0
+
+        if not (on_demand or auto_capture):
+            return view(*args, **kwargs)
+
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        profiler.begin(thread_id)
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        finally:
+            stacks = profiler.end(thread_id)
+        latency = time.perf_counter() - start
+
+        is_slow = auto_capture and latency >= profiler.slow_threshold
+        if not (on_demand or is_slow):
+            return response
+
+        profile = profiler.build_profile(stacks, latency)
+        profile["status_code"] = response.status_code
+        profiler.capture(profile, on_demand, is_slow)
+        if is_slow:
+            logger.warning(f"Requisição lenta em {request.path}: {latency:.3f}s")
+
+        if on_demand and response.is_json:
+            data = response.get_json()
+            data["profile"] = profile
+            response = app.make_response((jsonify(data), response.status_code))
+        return response
+    return wrapper
+
+class _InFlightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Agrupa chamadas concorrentes idênticas em uma única requisição"""
+
+    def __init__(self, lock_dir=None, result_ttl=2.0, stripes=64, claim_ttl=30.0, poll_interval=0.05):
+        self.lock_dir = lock_dir if fcntl else None
+        self.result_ttl = result_ttl
+        self.stripes = stripes
+        self.claim_ttl = claim_ttl
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.total_calls = 0
+        self.executed_calls = 0
+
+        if lock_dir and not fcntl:
+            logger.warning("Coordenação entre processos indisponível nesta plataforma")
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn):
+        """Executa fn uma única vez por chave entre chamadas concorrentes"""
+        with self._lock:
+            self.total_calls += 1
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+
+        if not is_leader:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result
+
+    def _execute(self, fn):
+        with self._lock:
+            self.executed_calls += 1
+        return fn()
+
+    @staticmethod
+    def _owner_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    @contextmanager
+    def _stripe_table(self, key):
+        """Abre a tabela de marcadores do stripe sob lock exclusivo (mantido só durante a leitura/escrita)"""
+        # Conjunto fixo de stripes: o diretório não cresce com payloads distintos
+        stripe = zlib.crc32(key.encode('utf-8')) % self.stripes
+        lock_path = os.path.join(self.lock_dir, f"stripe-{stripe}.lock")
+        table_path = os.path.join(self.lock_dir, f"stripe-{stripe}.json")
+
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(table_path, 'r', encoding='utf-8') as f:
+                        table = json.load(f)
+                except (OSError, ValueError):
+                    table = {}
+
+                # Remove marcadores vencidos ou de workers que morreram
+                now = time.time()
+                for marker_key, marker in list(table.items()):
+                    if marker['expires'] < now or (
+                        marker['state'] == 'pending' and not self._owner_alive(marker['owner'])
+                    ):
+                        del table[marker_key]
+
+                yield table
+
+                tmp_path = f"{table_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(table, f)
+                os.replace(tmp_path, table_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _run(self, key, fn):
+        """Coordena entre workers via marcadores por chave em arquivos de stripe"""
+        if not self.lock_dir:
+            return self._execute(fn)
+
+        while True:
+            try:
+                with self._stripe_table(key) as table:
+                    marker = table.get(key)
+                    if marker is None:
+                        table[key] = {
+                            'state': 'pending',
+                            'owner': os.getpid(),
+                            'expires': time.time() + self.claim_ttl
+                        }
+                        break
+                    if marker['state'] == 'done':
+                        return marker['result']
+            except OSError as e:
+                logger.warning(f"Coordenação entre processos indisponível: {e}")
+                return self._execute(fn)
+
+            # Outro worker está chamando a API para esta chave: aguardar sem segurar o lock
+            time.sleep(self.poll_interval)
+
+        result = None
+        try:
+            result = self._execute(fn)
+        finally:
+            try:
+                with self._stripe_table(key) as table:
+                    if result is not None:
+                        table[key] = {
+                            'state': 'done',
+                            'owner': os.getpid(),
+                            'expires': time.time() + self.result_ttl,
+                            'result': result
+                        }
+                    else:
+                        table.pop(key, None)
+            except (OSError, TypeError) as e:
+                logger.warning(f"Falha ao compartilhar resultado HF: {e}")
+
+        return result
+
+    def get_stats(self):
+        """Retorna contadores e taxa de colapso"""
+        with self._lock:
+            total = self.total_calls
+            executed = self.executed_calls
+        return {
+            "total_calls": total,
+            "upstream_calls": executed,
+            "collapse_ratio": round((total - executed) / total, 3) if total else 0.0,
+            "cross_process": self.lock_dir is not None
+        }
+
+
 class HybridEmailClassifier:
     def __init__(self):
         self.hf_token = os.environ.get('HF_TOKEN', None)
+        self.single_flight = SingleFlight(
+            lock_dir=os.environ.get('HF_SINGLEFLIGHT_DIR'),
+            result_ttl=float(os.environ.get('HF_SINGLEFLIGHT_TTL', 2)),
+            stripes=int(os.environ.get('HF_SINGLEFLIGHT_STRIPES', 64)),
+            claim_ttl=float(os.environ.get('HF_SINGLEFLIGHT_CLAIM_TTL', 30))
+        )
         
         self.hf_sentiment_api = "https://api-inference.huggingface.co/models/cardiffnlp/twitter-roberta-base-sentiment-latest"
         self.hf_classification_api = "https://api-inference.huggingface.co/models/neuralmind/bert-base-portuguese-cased"
@@ -88,6 +500,12 @@ class HybridEmailClassifier:
             logger.error(f"Erro ao extrair PDF: {e}")
             return ""
 
+    def extract_attachment_text(self, filename, data):
+        """Extrai texto de um anexo .txt ou .pdf a partir dos bytes"""
+        if filename.lower().endswith('.pdf'):
+            return self.extract_text_from_pdf(io.BytesIO(data))
+        return data.decode('utf-8')
+
     def preprocess_text(self, text):
         """Pré-processa o texto"""
         if not text:
@@ -210,7 +628,16 @@ class HybridEmailClassifier:
         
         payload = {"inputs": text}
         
+        # Chamadas idênticas simultâneas compartilham a mesma requisição
+        key = hashlib.sha256(f"{api_url}\n{text}".encode('utf-8')).hexdigest()
+        return self.single_flight.do(
+            key, lambda: self._post_huggingface(api_url, headers, payload, max_retries)
+        )
+
+    def _post_huggingface(self, api_url, headers, payload, max_retries):
+        """Envia a requisição ao Hugging Face com retry"""
         for attempt in range(max_retries):
+            count_stage_event('hf_attempts')
             try:
                 response = requests.post(
                     api_url, 
@@ -388,9 +815,11 @@ class HybridEmailClassifier:
 
     def classify_email(self, text):
         """Método principal - sistema híbrido"""
-        rules_result = self.classify_with_rules(text)
+        with profile_stage('rules'):
+            rules_result = self.classify_with_rules(text)
         
-        hf_result = self.classify_with_huggingface(text)
+        with profile_stage('huggingface'):
+            hf_result = self.classify_with_huggingface(text)
         
         final_result = self.combine_classifications(rules_result, hf_result)
         
@@ -605,46 +1034,481 @@ Equipe de Atendimento'''
             'priority': priority
         }
 
+class ClassificationHistory:
+    """Histórico de classificações em SQLite com agregados incrementais"""
+
+    HF_FALLBACK_METHOD = 'Rules Only (HF API unavailable)'
+
+    def __init__(self, db_path, batch_size=50, flush_interval=5.0, window_size=1000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._buffer = []
+        self._flush_event = threading.Event()
+
+        # Janela deslizante das últimas classificações
+        self._window = deque()
+        self._window_size = window_size
+        self._sorted_latencies = []
+        self._latency_sum = 0.0
+        self._category_counts = Counter()
+        self._hf_attempts = 0
+        self._hf_fallbacks = 0
+        self._recorded_since_start = 0
+
+        self._init_db()
+        self._warm_up()
+
+        self._flusher = threading.Thread(target=self._flush_loop, name='history-flusher', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        """Grava o buffer ao atingir batch_size ou a cada flush_interval, fora das requisições"""
+        while True:
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro no flush periódico do histórico: {e}")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        """Cria tabela e índices do histórico"""
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS classifications (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    email_type TEXT NOT NULL,
+                    priority TEXT,
+                    confidence TEXT,
+                    method TEXT NOT NULL,
+                    processing_time REAL NOT NULL,
+                    word_count INTEGER,
+                    hf_fallback INTEGER
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cls_timestamp ON classifications (timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cls_category ON classifications (category, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cls_email_type ON classifications (email_type, timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cls_method ON classifications (method, timestamp)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _warm_up(self):
+        """Recarrega a janela de agregados a partir dos registros mais recentes"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT processing_time, category, hf_fallback FROM classifications "
+                "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (self._window_size,)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Erro ao carregar histórico: {e}")
+            return
+        finally:
+            conn.close()
+
+        for latency, category, hf_fallback in reversed(rows):
+            hf_attempted = hf_fallback is not None
+            self._add_to_window(latency, category, hf_attempted, bool(hf_fallback))
+
+    def _add_to_window(self, latency, category, hf_attempted, hf_fallback):
+        """Atualiza os agregados incrementalmente (chamar com o lock)"""
+        if len(self._window) >= self._window_size:
+            old_latency, old_category, old_attempted, old_fallback = self._window.popleft()
+            del self._sorted_latencies[bisect_left(self._sorted_latencies, old_latency)]
+            self._latency_sum -= old_latency
+            self._category_counts[old_category] -= 1
+            if self._category_counts[old_category] <= 0:
+                del self._category_counts[old_category]
+            self._hf_attempts -= old_attempted
+            self._hf_fallbacks -= old_fallback
+
+        self._window.append((latency, category, hf_attempted, hf_fallback))
+        insort(self._sorted_latencies, latency)
+        self._latency_sum += latency
+        self._category_counts[category] += 1
+        self._hf_attempts += hf_attempted
+        self._hf_fallbacks += hf_fallback
+
+    def record(self, category, email_type, priority, confidence, method, processing_time, word_count):
+        """Registra uma classificação no buffer e nos agregados"""
+        hf_attempted = method.startswith('Hybrid') or method == self.HF_FALLBACK_METHOD
+        hf_fallback = method == self.HF_FALLBACK_METHOD
+        row = (
+            datetime.now().isoformat(),
+            category,
+            email_type,
+            priority,
+            confidence,
+            method,
+            processing_time,
+            word_count,
+            int(hf_fallback) if hf_attempted else None
+        )
+
+        with self._lock:
+            self._buffer.append(row)
+            self._add_to_window(processing_time, category, hf_attempted, hf_fallback)
+            self._recorded_since_start += 1
+            batch_ready = len(self._buffer) >= self.batch_size
+
+        # A gravação fica com a thread de flush para não somar I/O à latência da requisição
+        if batch_ready:
+            self._flush_event.set()
+
+    def flush(self):
+        """Grava o buffer pendente no SQLite em um único lote"""
+        with self._lock:
+            pending = self._buffer
+            self._buffer = []
+
+        if not pending:
+            return
+
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    "INSERT INTO classifications (timestamp, category, email_type, priority, confidence, "
+                    "method, processing_time, word_count, hf_fallback) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    pending
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Erro ao gravar histórico ({len(pending)} registros): {e}")
+            finally:
+                conn.close()
+
+    @staticmethod
+    def _percentile(sorted_values, pct):
+        if not sorted_values:
+            return None
+        index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+        return round(sorted_values[index], 3)
+
+    def _total_persisted(self):
+        """Total de registros gravados por todos os workers (MAX(id) usa o rowid)"""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT MAX(id) FROM classifications").fetchone()[0] or 0
+        except sqlite3.Error as e:
+            logger.error(f"Erro ao consultar total do histórico: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def get_stats(self):
+        """Retorna os agregados da janela deslizante deste worker"""
+        total_persisted = self._total_persisted()
+        with self._lock:
+            count = len(self._window)
+            latencies = self._sorted_latencies
+            stats = {
+                # A janela e os contadores são mantidos por processo (cada worker gunicorn)
+                "scope": "worker",
+                "worker_pid": os.getpid(),
+                "window_size": count,
+                "recorded_since_start": self._recorded_since_start,
+                "total_persisted": total_persisted,
+                "latency": {
+                    "avg": round(self._latency_sum / count, 3) if count else None,
+                    "p50": self._percentile(latencies, 50),
+                    "p90": self._percentile(latencies, 90),
+                    "p99": self._percentile(latencies, 99),
+                    "max": round(latencies[-1], 3) if latencies else None
+                },
+                "category_mix": {
+                    category: round(n / count, 3) for category, n in self._category_counts.items()
+                } if count else {},
+                "hf_fallback_rate": round(self._hf_fallbacks / self._hf_attempts, 3) if self._hf_attempts else None
+            }
+        return stats
+
+    def query(self, category=None, email_type=None, method=None, since=None, until=None, cursor=None, limit=50):
+        """Consulta paginada (keyset) usando os índices do histórico"""
+        self.flush()
+
+        clauses = []
+        params = []
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        if email_type:
+            clauses.append("email_type = ?")
+            params.append(email_type)
+        if method:
+            clauses.append("method = ?")
+            params.append(method)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if cursor:
+            cursor_timestamp, cursor_id = cursor
+            # Forma row-value: o SQLite percorre o índice a partir do cursor sem ordenar
+            clauses.append("(timestamp, id) < (?, ?)")
+            params.extend([cursor_timestamp, cursor_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            "SELECT id, timestamp, category, email_type, priority, confidence, method, "
+            f"processing_time, word_count, hf_fallback FROM classifications {where} "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?"
+        )
+        params.append(limit + 1)
+
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['timestamp']}_{rows[-1]['id']}"
+
+        for row in rows:
+            row['hf_fallback'] = None if row['hf_fallback'] is None else bool(row['hf_fallback'])
+
+        return rows, next_cursor
+
 # Instanciar classificador
 classifier = HybridEmailClassifier()
+history = ClassificationHistory(
+    app.config['HISTORY_DB_PATH'],
+    batch_size=app.config['HISTORY_BATCH_SIZE'],
+    flush_interval=app.config['HISTORY_FLUSH_INTERVAL'],
+    window_size=app.config['STATS_WINDOW_SIZE']
+)
+atexit.register(history.flush)
+
+# Processos de extração: fork evita reimportar o app no filho quando disponível
+if 'fork' in multiprocessing.get_all_start_methods():
+    extraction_context = multiprocessing.get_context('fork')
+else:
+    extraction_context = multiprocessing.get_context()
+
+# Um slot por processo de extração simultâneo
+attachment_slots = threading.BoundedSemaphore(app.config['ATTACHMENT_WORKERS'])
+
+# Threads apenas coordenam (esperam slot e processo); cada uma é limitada pelo prazo do anexo
+attachment_pool = ThreadPoolExecutor(
+    max_workers=app.config['ATTACHMENT_WORKERS'] * 4,
+    thread_name_prefix='attachment'
+)
+
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf')
+
+def _extract_in_subprocess(conn, filename, data, profile_interval=None):
+    """Extrai o texto em um processo filho, que pode ser encerrado se travar"""
+    # Profiler próprio do filho: o herdado do pai pode ter o lock preso no fork
+    child_profiler = RequestProfiler(interval=profile_interval) if profile_interval else None
+    thread_id = threading.get_ident()
+    if child_profiler:
+        child_profiler.begin(thread_id)
+    try:
+        payload = ('ok', classifier.extract_attachment_text(filename, data))
+    except Exception as e:
+        payload = ('error', str(e))
+    stacks = dict(child_profiler.end(thread_id)) if child_profiler else {}
+    conn.send(payload + (stacks,))
+    conn.close()
+
+def extract_attachment(filename, data, queued_at, profile_interval=None):
+    """Aguarda um slot dentro do prazo do anexo e extrai em processo descartável"""
+    budget = app.config['ATTACHMENT_TIMEOUT']
+    result = {"queue_time": None, "extraction_time": None}
+
+    remaining = queued_at + budget - time.monotonic()
+    if remaining <= 0 or not attachment_slots.acquire(timeout=remaining):
+        result["queue_time"] = round(time.monotonic() - queued_at, 3)
+        result["status"] = 'timeout'
+        return result
+
+    start = time.monotonic()
+    result["queue_time"] = round(start - queued_at, 3)
+    status = 'timeout'
+    parent_conn, child_conn = extraction_context.Pipe(duplex=False)
+    process = extraction_context.Process(
+        target=_extract_in_subprocess, args=(child_conn, filename, data, profile_interval), daemon=True
+    )
+    try:
+        process.start()
+        child_conn.close()
+
+        if parent_conn.poll(budget):
+            try:
+                status, value, result["profile_stacks"] = parent_conn.recv()
+            except EOFError:
+                status, value = 'error', 'processo de extração encerrado inesperadamente'
+        else:
+            status, value = 'timeout', None
+
+        result["extraction_time"] = round(time.monotonic() - start, 3)
+    finally:
+        # Processo travado é encerrado na hora, liberando o slot
+        if status != 'timeout':
+            process.join(0.5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        parent_conn.close()
+        attachment_slots.release()
+
+    if status == 'ok':
+        result["text"] = value
+        result["status"] = 'ok' if value and value.strip() else 'empty'
+    elif status == 'error':
+        logger.error(f"Erro ao extrair anexo {filename}: {value}")
+        result["status"] = 'error'
+    else:
+        logger.warning(f"Anexo {filename} excedeu {budget}s de extração")
+        result["status"] = 'timeout'
+    return result
+
+def extract_attachments(attachments):
+    """Extrai os anexos em paralelo respeitando o limite de tempo de cada um"""
+    results = []
+    futures = {}
+    queued_at = time.monotonic()
+
+    # Se a requisição está sendo amostrada, os processos de extração também são
+    request_thread = threading.get_ident()
+    profile_interval = profiler.interval if profiler.is_active(request_thread) else None
+
+    for index, (filename, data, status) in enumerate(attachments):
+        results.append({
+            "filename": filename,
+            "size": len(data),
+            "status": status,
+            "queue_time": None,
+            "extraction_time": None
+        })
+        if status == 'pending':
+            futures[attachment_pool.submit(
+                extract_attachment, filename, data, queued_at, profile_interval
+            )] = index
+
+    # Cada tarefa termina em no máximo 2x ATTACHMENT_TIMEOUT (espera por slot + extração)
+    for future in futures:
+        result = results[futures[future]]
+        try:
+            result.update(future.result())
+        except Exception as e:
+            logger.error(f"Erro ao extrair anexo {result['filename']}: {e}")
+            result["status"] = 'error'
+
+        stacks = result.pop("profile_stacks", None)
+        if stacks:
+            profiler.merge(request_thread, stacks, f"attachment[{result['filename']}]")
+
+    return results
+
+def read_uploaded_attachments():
+    """Lê os arquivos enviados aplicando os limites de quantidade e tamanho"""
+    files = [f for f in request.files.getlist('file') + request.files.getlist('files') if f.filename != '']
+    max_size = app.config['ATTACHMENT_MAX_SIZE']
+    max_attachments = app.config['MAX_ATTACHMENTS']
+    attachments = []
+
+    for file in files[:max_attachments]:
+        filename = secure_filename(file.filename)
+        if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            attachments.append((filename, b"", 'unsupported'))
+            continue
+
+        data = file.read(max_size + 1)
+        if len(data) > max_size:
+            attachments.append((filename, b"", 'too_large'))
+        else:
+            attachments.append((filename, data, 'pending'))
+
+    # Arquivos além do limite são listados na resposta sem serem processados
+    for file in files[max_attachments:]:
+        attachments.append((secure_filename(file.filename), b"", 'skipped'))
+
+    if len(files) > max_attachments:
+        logger.warning(f"{len(files) - max_attachments} anexos ignorados (limite de {max_attachments})")
+
+    return attachments
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
 @app.route('/analyze', methods=['POST'])
+@profiled
 def analyze_email():
     try:
         start_time = datetime.now()
         email_text = ""
         
+        attachment_results = None
+        
         # Processar entrada
-        if 'file' in request.files and request.files['file'].filename != '':
-            file = request.files['file']
-            filename = secure_filename(file.filename)
-            
-            if filename.lower().endswith('.pdf'):
-                email_text = classifier.extract_text_from_pdf(file)
-            elif filename.lower().endswith('.txt'):
-                email_text = file.read().decode('utf-8')
-            else:
-                return jsonify({"error": "Formato não suportado. Use .txt ou .pdf"}), 400
-                
-        elif request.is_json:
+        if request.is_json:
             data = request.get_json()
             email_text = data.get('email_text', '')
         else:
             email_text = request.form.get('email_text', '')
+            attachments = read_uploaded_attachments()
+            
+            if attachments:
+                if all(status == 'unsupported' for _, _, status in attachments) and not email_text.strip():
+                    return jsonify({"error": "Formato não suportado. Use .txt ou .pdf"}), 400
+                
+                with profile_stage('attachment_extraction'):
+                    attachment_results = extract_attachments(attachments)
+                
+                # Evidência combinada: corpo + anexos extraídos
+                parts = [email_text] if email_text.strip() else []
+                parts.extend(r['text'] for r in attachment_results if r['status'] == 'ok')
+                email_text = "\n\n".join(parts)
+                
+                for result in attachment_results:
+                    text = result.pop('text', None)
+                    if result['status'] == 'ok':
+                        att_category, att_type, att_priority, att_scores = classifier.classify_with_rules(text)
+                        result.update({
+                            "category": att_category,
+                            "email_type": att_type,
+                            "priority": att_priority,
+                            "scores": att_scores,
+                            "word_count": len(text.split())
+                        })
 
         if not email_text or len(email_text.strip()) < 3:
             return jsonify({"error": "Texto muito curto ou vazio"}), 400
         
-        if not classifier.is_portuguese_text(email_text):
+        with profile_stage('language_detection'):
+            is_portuguese = classifier.is_portuguese_text(email_text)
+        
+        if not is_portuguese:
             response_data = classifier.generate_professional_response(
                 category='Improdutivo', 
                 email_type='language_error', 
                 priority='baixa'
             )
+            processing_time = (datetime.now() - start_time).total_seconds()
+            history.record('Improdutivo', 'language_error', 'baixa', 'Alta', 'Language Detection',
+                           processing_time, len(email_text.split()))
             return jsonify({
                 "category": "Improdutivo",
                 "email_type": "language_error",
@@ -652,8 +1516,9 @@ def analyze_email():
                 "confidence": "Alta",
                 "method": "Language Detection",
                 "suggested_response": response_data,
-                "processing_time": 0.1,
+                "processing_time": round(processing_time, 3),
                 "word_count": len(email_text.split()),
+                "attachments": attachment_results,
                 "message": "Email detectado em idioma diferente do português"
             })
 
@@ -663,6 +1528,8 @@ def analyze_email():
         
         end_time = datetime.now()
         processing_time = (end_time - start_time).total_seconds()
+        history.record(category, email_type, priority, confidence, method,
+                       processing_time, len(email_text.split()))
 
         return jsonify({
             "category": category,
@@ -678,6 +1545,7 @@ def analyze_email():
             },
             "processing_time": round(processing_time, 3),
             "word_count": len(email_text.split()),
+            "attachments": attachment_results,
             "classification_details": {
                 "algorithm": "Hybrid System (Rules + Hugging Face API)",
                 "api_provider": "Hugging Face Inference API",
@@ -706,13 +1574,16 @@ def health_check():
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Endpoint com estatísticas da API"""
+    live_stats = history.get_stats()
     return jsonify({
         "supported_formats": [".txt", ".pdf"],
         "max_file_size": "16MB",
         "categories": ["Produtivo", "Improdutivo"],
         "email_types": list(classifier.financial_patterns.keys()),
         "priority_levels": ["alta", "media", "baixa"],
-        "average_processing_time": "< 2 segundos",
+        "average_processing_time": live_stats['latency']['avg'],
+        "live_stats": live_stats,
+        "hf_single_flight": classifier.single_flight.get_stats(),
         "classification_method": "Hybrid (Rules + Hugging Face API)",
         "ai_provider": "Hugging Face Inference API",
         "nlp_features": [
@@ -731,6 +1602,73 @@ def get_stats():
         ]
     })
 
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """Consulta paginada do histórico de classificações"""
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+    except ValueError:
+        return jsonify({"error": "Parâmetro 'limit' inválido"}), 400
+
+    cursor = None
+    raw_cursor = request.args.get('cursor')
+    if raw_cursor:
+        try:
+            cursor_timestamp, cursor_id = raw_cursor.rsplit('_', 1)
+            cursor = (cursor_timestamp, int(cursor_id))
+        except ValueError:
+            return jsonify({"error": "Parâmetro 'cursor' inválido"}), 400
+
+    # Normaliza para o mesmo formato ISO (hora local, sem fuso) gravado no histórico
+    bounds = {}
+    for name in ('since', 'until'):
+        raw_value = request.args.get(name)
+        if not raw_value:
+            bounds[name] = None
+            continue
+        try:
+            value = datetime.fromisoformat(raw_value)
+        except ValueError:
+            return jsonify({"error": f"Parâmetro '{name}' inválido (use ISO 8601)"}), 400
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        bounds[name] = value.isoformat()
+
+    try:
+        items, next_cursor = history.query(
+            category=request.args.get('category'),
+            email_type=request.args.get('email_type'),
+            method=request.args.get('method'),
+            since=bounds['since'],
+            until=bounds['until'],
+            cursor=cursor,
+            limit=limit
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Erro ao consultar histórico: {e}")
+        return jsonify({"error": "Histórico indisponível"}), 500
+
+    return jsonify({
+        "items": items,
+        "count": len(items),
+        "next_cursor": next_cursor
+    })
+
+@app.route('/api/admin/slow-requests', methods=['GET'])
+def get_slow_requests():
+    """Lista as requisições lentas capturadas pelo profiler (admin)"""
+    if not is_admin_request():
+        return jsonify({"error": "Acesso não autorizado"}), 403
+    
+    return jsonify({
+        "slow_threshold": profiler.slow_threshold,
+        "sample_interval": profiler.interval,
+        "buffer_size": profiler.buffer_size,
+        "window": profiler.window,
+        "requests": profiler.get_slowest(),
+        "on_demand": profiler.get_on_demand()
+    })
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
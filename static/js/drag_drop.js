@@ -26,7 +26,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const files = dt.files;
         if (files.length > 0) {
             fileInput.files = files;
-            alert(`Arquivo selecionado: ${files[0].name}`);
+            fileInput.dispatchEvent(new Event('change'));
         }
     }
 });
\ No newline at end of file
@@ -63,15 +63,17 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 
     function handleFileSelection(e) {
-        const file = e.target.files[0];
-        if (file) {
-            showFileInfo(file);
+        const files = Array.from(e.target.files);
+        if (files.length) {
+            showFileInfo(files);
         }
     }
 
-    function showFileInfo(file) {
+    function showFileInfo(files) {
         if (fileName && fileInfo) {
-            fileName.textContent = `${file.name} (${formatFileSize(file.size)})`;
+            fileName.textContent = files
+                .map(file => `${file.name} (${formatFileSize(file.size)})`)
+                .join(', ');
             fileInfo.style.display = 'flex';
             
             // Esconder área de drop
@@ -185,20 +187,24 @@ document.addEventListener('DOMContentLoaded', () => {
                 return false;
             }
             
-            const file = fileInput.files[0];
+            const files = Array.from(fileInput.files);
             const maxSize = 16 * 1024 * 1024; // 16MB
+            const totalSize = files.reduce((sum, file) => sum + file.size, 0);
             
-            if (file.size > maxSize) {
-                showError('Arquivo muito grande. Máximo de 16MB.');
+            if (totalSize > maxSize) {
+                showError('Arquivos muito grandes. Máximo de 16MB no total.');
                 return false;
             }
             
             const allowedTypes = ['.txt', '.pdf'];
-            const fileExtension = '.' + file.name.split('.').pop().toLowerCase();
             
-            if (!allowedTypes.includes(fileExtension)) {
-                showError('Formato de arquivo não suportado. Use .txt ou .pdf');
-                return false;
+            for (const file of files) {
+                const fileExtension = '.' + file.name.split('.').pop().toLowerCase();
+                
+                if (!allowedTypes.includes(fileExtension)) {
+                    showError(`Formato de arquivo não suportado (${file.name}). Use .txt ou .pdf`);
+                    return false;
+                }
             }
         }
         